@@ -3,25 +3,48 @@ Conversation history storage using SQLite.
 
 Each VAPI call has a unique call_id. All messages for that call are stored
 in chronological order so the LLM receives full conversational context.
+
+Recently active calls are also mirrored in memory so each turn only reads
+rows newer than the last one seen; the database remains the source of
+truth, so other processes' writes and deletes are picked up on the next read.
 """
 
 import sqlite3
 import threading
+from collections import OrderedDict
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "conversations.db"
+MEM_CACHE_CALLS = 1000  # max calls whose history is kept in memory
 
 
 class ConversationStore:
     """Thread-safe, file-based conversation memory backed by SQLite."""
 
-    def __init__(self, db_path: str | Path = DB_PATH):
+    # Fixed SQL text so sqlite3's statement cache reuses the prepared form
+    _INSERT_SQL = "INSERT INTO messages (call_id, role, content) VALUES (?, ?, ?)"
+    _SELECT_SQL = (
+        "SELECT id, role, content FROM messages "
+        "WHERE call_id = ? AND id > ? ORDER BY id ASC"
+    )
+    _COUNT_SQL = "SELECT COUNT(*) FROM messages WHERE call_id = ? AND id <= ?"
+    _DELETE_SQL = "DELETE FROM messages WHERE call_id = ?"
+
+    def __init__(self, db_path: str | Path = DB_PATH, mem_calls: int = MEM_CACHE_CALLS):
         self.db_path = str(db_path)
         self._lock = threading.Lock()
+        # call_id → (message list, last mirrored id), least recently used first
+        self._mem: OrderedDict[str, tuple[list[dict], int]] = OrderedDict()
+        self._mem_calls = mem_calls
         # Single connection reused across calls (check_same_thread=False
         # lets Flask's threaded mode work; the lock serialises writes).
         self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL is still crash-safe but skips the per-commit fsync.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
         self._init_db()
 
     # ── private helpers ─────────────────────────────────────────────────────
@@ -37,39 +60,94 @@ class ConversationStore:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # (call_id, id) serves both get_history's range scan and
+            # list_calls' grouping without a temp-table sort; it supersedes
+            # the old single-column index.
             self._conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_call_id
-                ON messages(call_id)
+                CREATE INDEX IF NOT EXISTS idx_messages_call_id_id
+                ON messages(call_id, id)
             """)
+            self._conn.execute("DROP INDEX IF EXISTS idx_messages_call_id")
+
+    def _load(self, call_id: str) -> list[dict]:
+        """Return the mirrored history for a call, synced with SQLite.
+
+        Only rows newer than the last mirrored id are fetched.  If rows the
+        mirror already holds were deleted (e.g. clear_call in another
+        process), the call is reloaded from scratch.
+
+        Caller must hold self._lock.
+        """
+        history, last_id = self._mem.get(call_id, (None, 0))
+        if history is not None:
+            (kept,) = self._conn.execute(self._COUNT_SQL, (call_id, last_id)).fetchone()
+            if kept != len(history):
+                history, last_id = None, 0
+        if history is None:
+            history = []
+
+        rows = self._conn.execute(self._SELECT_SQL, (call_id, last_id)).fetchall()
+        if rows:
+            history.extend({"role": r, "content": c} for _, r, c in rows)
+            last_id = rows[-1][0]
+
+        self._mem[call_id] = (history, last_id)
+        self._mem.move_to_end(call_id)
+        if len(self._mem) > self._mem_calls:
+            self._mem.popitem(last=False)
+        return history
 
     # ── public API ──────────────────────────────────────────────────────────
 
     def add_message(self, call_id: str, role: str, content: str):
         """Append a message to a call's history."""
-        with self._lock:
-            self._conn.execute(
-                "INSERT INTO messages (call_id, role, content) VALUES (?, ?, ?)",
-                (call_id, role, content),
+        self.add_messages(call_id, [(role, content)])
+
+    def add_messages(self, call_id: str, rows: list[tuple[str, str]]):
+        """Append several (role, content) messages in a single transaction."""
+        if not rows:
+            return
+        with self._lock, self._conn:
+            # The mirror picks these up on the next read (id > last seen)
+            self._conn.executemany(
+                self._INSERT_SQL,
+                [(call_id, role, content) for role, content in rows],
             )
-            self._conn.commit()
+
+    def record_turn(self, call_id: str, user: str, assistant: str):
+        """Persist a user message and the assistant's reply together."""
+        rows = [("user", user), ("assistant", assistant)]
+        self.add_messages(call_id, [(r, c) for r, c in rows if c])
 
     def get_history(self, call_id: str) -> list[dict]:
         """Return the full ordered message list for a call."""
-        rows = self._conn.execute(
-            "SELECT role, content FROM messages WHERE call_id = ? ORDER BY id ASC",
-            (call_id,),
-        ).fetchall()
-        return [{"role": r, "content": c} for r, c in rows]
+        with self._lock:
+            return list(self._load(call_id))
+
+    def get_recent(self, call_id: str, limit: int = 20) -> list[dict]:
+        """Return only the last `limit` messages for a call, oldest first.
+
+        The window is trimmed to start on a user message, so the LLM never
+        sees a reply without the question that prompted it.
+        """
+        if limit <= 0:
+            return []
+        with self._lock:
+            recent = self._load(call_id)[-limit:]
+        start = 0
+        while start < len(recent) and recent[start]["role"] != "user":
+            start += 1
+        return recent[start:]
 
     def clear_call(self, call_id: str):
         """Delete all messages for a finished call (optional cleanup)."""
-        with self._lock:
-            self._conn.execute("DELETE FROM messages WHERE call_id = ?", (call_id,))
-            self._conn.commit()
+        with self._lock, self._conn:
+            self._conn.execute(self._DELETE_SQL, (call_id,))
+            self._mem.pop(call_id, None)
 
     def list_calls(self) -> list[str]:
         """Return distinct call_ids (useful for debugging)."""
         rows = self._conn.execute(
-            "SELECT DISTINCT call_id FROM messages ORDER BY MIN(id)"
+            "SELECT call_id FROM messages GROUP BY call_id ORDER BY MIN(id)"
         ).fetchall()
         return [r[0] for r in rows]
@@ -0,0 +1,80 @@
+"""
+Persistent embedding cache using SQLite.
+
+Chunks are keyed by sha256(model | text), so re-ingesting unchanged
+documents never calls Ollama again.  Vectors are stored as packed float16
+bytes (a quarter of float64) — plenty of precision for cosine similarity.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from rag import EMBED_MODEL
+
+CACHE_PATH = Path(__file__).parent / "embedding_cache.db"
+CACHE_DTYPE = np.float16
+
+
+class EmbeddingCache:
+    """Thread-safe, file-based model+text → vector cache backed by SQLite."""
+
+    def __init__(self, db_path: str | Path = CACHE_PATH, model: str = EMBED_MODEL):
+        self.db_path = str(db_path)
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_db()
+
+    # ── private helpers ─────────────────────────────────────────────────────
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_f16 (
+                    key TEXT PRIMARY KEY,
+                    vec BLOB NOT NULL
+                )
+            """)
+            # Superseded float32 table from the first cache format
+            self._conn.execute("DROP TABLE IF EXISTS cache")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}|{text}".encode("utf-8")).hexdigest()
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Return the cached float32 vector for each text, or None on a miss."""
+        keys = [self._key(t) for t in texts]
+        found: dict[str, bytes] = {}
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            part = keys[i : i + 500]
+            placeholders = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM cache_f16 WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+            found.update(rows)
+        return [
+            np.frombuffer(found[k], dtype=CACHE_DTYPE).astype(np.float32)
+            if k in found else None
+            for k in keys
+        ]
+
+    def put_many(self, texts: list[str], vectors):
+        """Store vectors (lists or array rows) for texts in a single transaction."""
+        rows = [
+            (self._key(t), np.asarray(v, dtype=CACHE_DTYPE).tobytes())
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache_f16 (key, vec) VALUES (?, ?)", rows
+            )
@@ -17,13 +17,21 @@ Prerequisites:
 import os
 import sys
 import argparse
+import queue
+import re
+import threading
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from rag import get_embedding  # noqa: E402  (needs env loaded first)
+from rag import EMBED_BATCH_SIZE, get_embeddings_batch  # noqa: E402  (needs env loaded first)
+from embedding_cache import EmbeddingCache                # noqa: E402
 
 # ── Config ──────────────────────────────────────────────────────────────────
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
@@ -34,6 +42,10 @@ EMBED_DIMENSION = int(os.environ.get("EMBED_DIMENSION", "768"))
 
 CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "500"))     # characters per chunk
 CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "50"))  # overlap between chunks
+EMBED_CONCURRENCY = max(1, int(os.environ.get("EMBED_CONCURRENCY", "4")))  # parallel embed requests
+UPSERT_QUEUE_SIZE = 4  # embedded windows waiting for upsert
+# Split boundaries, coarsest first: paragraph → line → sentence → word
+CHUNK_SEPARATORS = ("\n\n", "\n", ". ", " ")
 
 SUPPORTED_EXTENSIONS = {".txt", ".md"}
 
@@ -41,21 +53,61 @@ SUPPORTED_EXTENSIONS = {".txt", ".md"}
 # ── Chunking ────────────────────────────────────────────────────────────────
 
 
-def chunk_text(
+def _split(text: str, separators: tuple[str, ...], chunk_size: int) -> Iterator[str]:
+    """Yield pieces of at most `chunk_size` chars, cutting on the coarsest
+    separator that works.  Separators stay attached so pieces re-join cleanly.
+    """
+    if len(text) <= chunk_size:
+        yield text
+        return
+    if not separators:
+        # No natural boundary left — fall back to a hard character cut
+        for i in range(0, len(text), chunk_size):
+            yield text[i : i + chunk_size]
+        return
+
+    sep, rest = separators[0], separators[1:]
+    if sep not in text:
+        yield from _split(text, rest, chunk_size)
+        return
+
+    parts = text.split(sep)
+    last = len(parts) - 1
+    for i, part in enumerate(parts):
+        piece = part + sep if i < last else part
+        if len(piece) <= chunk_size:
+            yield piece
+        else:
+            yield from _split(piece, rest, chunk_size)
+
+
+def iter_chunks(
     text: str,
     chunk_size: int = CHUNK_SIZE,
     overlap: int = CHUNK_OVERLAP,
-) -> list[str]:
-    """Split text into overlapping chunks of roughly `chunk_size` characters."""
-    chunks: list[str] = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start += chunk_size - overlap
-    return chunks
+) -> Iterator[str]:
+    """Yield chunks of up to `chunk_size` characters on natural boundaries.
+
+    Text is split on paragraphs, then lines, then sentences, then words,
+    and adjacent pieces are merged greedily.  Up to `overlap` characters
+    of trailing pieces are carried into the next chunk.
+    """
+    window: deque[str] = deque()
+    length = 0
+    for piece in _split(text, CHUNK_SEPARATORS, chunk_size):
+        if window and length + len(piece) > chunk_size:
+            chunk = "".join(window).strip()
+            if chunk:
+                yield chunk
+            # Drop from the front until only the overlap carry remains
+            while window and (length > overlap or length + len(piece) > chunk_size):
+                length -= len(window.popleft())
+        window.append(piece)
+        length += len(piece)
+
+    chunk = "".join(window).strip()
+    if chunk:
+        yield chunk
 
 
 # ── Pinecone helpers ────────────────────────────────────────────────────────
@@ -91,20 +143,51 @@ def ensure_index(pc, recreate: bool = False):
     print("Done.")
 
 
-def ingest_file(index, file_path: Path):
-    """Read → chunk → embed → upsert a single file into Pinecone."""
-    print(f"\nIngesting: {file_path}")
+def embed_chunks(chunks: list[str]) -> list[list[float]]:
+    """Embed chunks in batches, with up to EMBED_CONCURRENCY batches in flight.
 
-    text = file_path.read_text(encoding="utf-8")
-    chunks = chunk_text(text)
-    print(f"  {len(chunks)} chunk(s)")
+    `ex.map` returns results in submission order, so the flattened list
+    lines up one-to-one with `chunks`.
+    """
+    batches = [
+        chunks[i : i + EMBED_BATCH_SIZE]
+        for i in range(0, len(chunks), EMBED_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as ex:
+        results = list(ex.map(get_embeddings_batch, batches))
+    return [vec for batch in results for vec in batch]
+
+
+def embed_chunks_cached(cache: EmbeddingCache, chunks: list[str]) -> np.ndarray:
+    """Embed chunks, only calling Ollama for those not already in `cache`.
+
+    Returns a single (len(chunks), dim) float32 array.
+    """
+    embeddings = cache.get_many(chunks)
+    misses = [i for i, vec in enumerate(embeddings) if vec is None]
+    print(f"  Cache: {len(chunks) - len(misses)} hit(s), {len(misses)} miss(es)")
+
+    if misses:
+        miss_chunks = [chunks[i] for i in misses]
+        fresh = np.asarray(embed_chunks(miss_chunks), dtype=np.float32)
+        cache.put_many(miss_chunks, fresh)
+        for i, vec in zip(misses, fresh):
+            embeddings[i] = vec
+    return np.vstack(embeddings)
+
+
+def _embed_window(file_path: Path, chunks: list[str], offset: int,
+                  cache: EmbeddingCache) -> list[dict]:
+    """Embed one window of chunks into Pinecone vector records.
+
+    `values` stays a float32 array row until the upsert boundary.
+    """
+    embeddings = embed_chunks_cached(cache, chunks)
 
     vectors = []
-    for i, chunk in enumerate(chunks):
-        vec_id = f"{file_path.stem}_{i}"
-        embedding = get_embedding(chunk)
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=offset):
         vectors.append({
-            "id": vec_id,
+            "id": f"{file_path.stem}_{i}",
             "values": embedding,
             "metadata": {
                 "text": chunk,
@@ -112,16 +195,96 @@ def ingest_file(index, file_path: Path):
                 "chunk_index": i,
             },
         })
-        if (i + 1) % 10 == 0:
-            print(f"  Embedded {i + 1}/{len(chunks)}")
+    return vectors
+
 
-    # Upsert in batches of 100
+def _upsert_vectors(index, vectors: list[dict]):
+    """Upsert vector records in batches of 100."""
     BATCH = 100
     for i in range(0, len(vectors), BATCH):
-        batch = vectors[i : i + BATCH]
+        # Pinecone wants plain floats — convert one batch at a time
+        batch = [
+            {**v, "values": v["values"].tolist()}
+            for v in vectors[i : i + BATCH]
+        ]
         index.upsert(vectors=batch)
 
-    print(f"  Upserted {len(vectors)} vectors")
+
+def _delete_stale_vectors(index, file_path: Path, keep: int) -> int:
+    """Delete this file's vectors with chunk index >= `keep`; returns count.
+
+    Ids are `<stem>_<n>`, so after re-chunking a shorter run of chunks the
+    old tail would otherwise stay searchable next to the new chunks.
+    """
+    id_re = re.compile(rf"{re.escape(file_path.stem)}_(\d+)")
+    stale = [
+        vec_id
+        for page in index.list(prefix=f"{file_path.stem}_")
+        for vec_id in page
+        if (m := id_re.fullmatch(vec_id)) and int(m.group(1)) >= keep
+    ]
+    # Pinecone accepts at most 1000 ids per delete call
+    for i in range(0, len(stale), 1000):
+        index.delete(ids=stale[i : i + 1000])
+    return len(stale)
+
+
+def ingest_file(index, file_path: Path, cache: EmbeddingCache):
+    """Read → chunk → embed → upsert a single file into Pinecone.
+
+    Chunks are streamed in windows of one concurrent embedding round
+    (EMBED_BATCH_SIZE × EMBED_CONCURRENCY), so peak memory stays flat
+    regardless of document size.  Embedding (this thread) and upserting
+    (a worker thread) are pipelined through a small bounded queue.  Vectors
+    left over from an earlier, longer ingest of the same file are deleted.
+    """
+    print(f"\nIngesting: {file_path}")
+
+    text = file_path.read_text(encoding="utf-8")
+    window = EMBED_BATCH_SIZE * EMBED_CONCURRENCY
+
+    pending: queue.Queue[list[dict] | None] = queue.Queue(maxsize=UPSERT_QUEUE_SIZE)
+    errors: list[Exception] = []
+    upserted = 0
+
+    def upsert_worker():
+        nonlocal upserted
+        while (vectors := pending.get()) is not None:
+            if errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                _upsert_vectors(index, vectors)
+                upserted += len(vectors)
+                print(f"  Upserted {upserted} vectors so far")
+            except Exception as e:
+                errors.append(e)
+
+    worker = threading.Thread(target=upsert_worker, daemon=True)
+    worker.start()
+    try:
+        offset = 0
+        buf: list[str] = []
+        for chunk in iter_chunks(text):
+            buf.append(chunk)
+            if len(buf) == window:
+                if errors:
+                    break
+                pending.put(_embed_window(file_path, buf, offset, cache))
+                offset += len(buf)
+                buf = []
+        if buf and not errors:
+            pending.put(_embed_window(file_path, buf, offset, cache))
+    finally:
+        pending.put(None)
+        worker.join()
+
+    if errors:
+        raise errors[0]
+    print(f"  Upserted {upserted} vectors")
+
+    removed = _delete_stale_vectors(index, file_path, keep=upserted)
+    if removed:
+        print(f"  Deleted {removed} stale vector(s) from a previous ingest")
 
 
 # ── CLI ─────────────────────────────────────────────────────────────────────
@@ -145,13 +308,14 @@ def main():
     pc = Pinecone(api_key=PINECONE_API_KEY)
     ensure_index(pc, recreate=args.recreate)
     index = pc.Index(PINECONE_INDEX_NAME)
+    cache = EmbeddingCache()
 
     if args.file:
         path = Path(args.file)
         if not path.exists():
             print(f"File not found: {path}")
             sys.exit(1)
-        ingest_file(index, path)
+        ingest_file(index, path, cache)
     else:
         doc_dir = Path(args.dir)
         if not doc_dir.exists():
@@ -166,7 +330,7 @@ def main():
 
         print(f"Found {len(files)} file(s) to ingest\n")
         for f in files:
-            ingest_file(index, f)
+            ingest_file(index, f, cache)
 
     print("\nIngestion complete!")
 
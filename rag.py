@@ -6,31 +6,57 @@ Pinecone stores document chunks and handles similarity search.
 """
 
 import os
+import time
+from functools import lru_cache
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # ── Config (loaded from env / .env) ─────────────────────────────────────────
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 EMBED_MODEL = os.environ.get("EMBED_MODEL", "nomic-embed-text")
-
-# Lazy-initialized Pinecone index (created on first use)
+EMBED_BATCH_SIZE = max(1, int(os.environ.get("OLLAMA_EMBED_BATCH", "64")))  # texts per /api/embed call
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "2048"))  # in-memory cached embeddings
+RAG_CACHE_TTL = int(os.environ.get("RAG_CACHE_TTL", "60"))  # seconds to reuse search results
+
+# Shared keep-alive session: every Ollama call (and concurrent embedding
+# batches during ingestion) reuses pooled TCP connections.
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=40))
+_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=40))
+
+# Lazy-initialized Pinecone client + index (created on first use)
+_pinecone_client = None
 _pinecone_index = None
 
 
+def _get_pinecone_client():
+    """Return a cached Pinecone client, or None if no API key is set."""
+    global _pinecone_client
+    if _pinecone_client is not None:
+        return _pinecone_client
+
+    api_key = os.environ.get("PINECONE_API_KEY")
+    if not api_key:
+        return None
+
+    from pinecone import Pinecone
+
+    _pinecone_client = Pinecone(api_key=api_key)
+    return _pinecone_client
+
+
 def _get_pinecone_index():
     """Return a cached Pinecone Index object, or None if not configured."""
     global _pinecone_index
     if _pinecone_index is not None:
         return _pinecone_index
 
-    api_key = os.environ.get("PINECONE_API_KEY")
     index_name = os.environ.get("PINECONE_INDEX_NAME")
-
-    if not api_key or not index_name:
+    pc = _get_pinecone_client()
+    if pc is None or not index_name:
         return None
 
-    from pinecone import Pinecone
-
-    pc = Pinecone(api_key=api_key)
     _pinecone_index = pc.Index(index_name)
     return _pinecone_index
 
@@ -43,14 +69,50 @@ def get_embedding(text: str) -> list[float]:
 
     Uses the /api/embed endpoint (Ollama ≥ 0.4).
     Make sure the model is pulled first:  ollama pull nomic-embed-text
+
+    Results are memoised in-process, so repeated short utterances
+    ("yes", "thanks") skip the round-trip entirely.
     """
-    resp = requests.post(
+    return list(_get_embedding_cached(text))
+
+
+@lru_cache(maxsize=EMBED_CACHE_SIZE)
+def _get_embedding_cached(text: str) -> tuple[float, ...]:
+    """Fetch one embedding from Ollama (stored as a tuple so it's immutable)."""
+    resp = _session.post(
         f"{OLLAMA_BASE_URL}/api/embed",
         json={"model": EMBED_MODEL, "input": text},
         timeout=30,
     )
     resp.raise_for_status()
-    return resp.json()["embeddings"][0]
+    return tuple(resp.json()["embeddings"][0])
+
+
+def get_embeddings_batch(
+    texts: list[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> list[list[float]]:
+    """Embed many texts with as few /api/embed round-trips as possible.
+
+    Ollama accepts a list as `input`, so each request embeds up to
+    `batch_size` texts at once.  If a response doesn't contain exactly one
+    vector per input, that batch falls back to one-at-a-time embedding.
+    """
+    batch_size = max(1, batch_size)
+    embeddings: list[list[float]] = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i : i + batch_size]
+        resp = _session.post(
+            f"{OLLAMA_BASE_URL}/api/embed",
+            json={"model": EMBED_MODEL, "input": batch},
+            timeout=120,
+        )
+        resp.raise_for_status()
+        vectors = resp.json().get("embeddings")
+        if not isinstance(vectors, list) or len(vectors) != len(batch):
+            vectors = [get_embedding(text) for text in batch]
+        embeddings.extend(vectors)
+    return embeddings
 
 
 # ── Search ──────────────────────────────────────────────────────────────────
@@ -64,13 +126,36 @@ def search_context(
     """Embed the query and return matching document chunks from Pinecone.
 
     Returns an empty list if Pinecone is not configured or no matches
-    exceed the score threshold.
+    exceed the score threshold.  Results for the same (whitespace- and
+    case-normalised) query are reused for up to RAG_CACHE_TTL seconds;
+    a TTL of 0 or less disables the cache.
     """
-    index = _get_pinecone_index()
-    if index is None:
+    query_norm = " ".join(query.lower().split())
+    if not query_norm or _get_pinecone_index() is None:
         return []
 
-    embedding = get_embedding(query)
+    if RAG_CACHE_TTL <= 0:
+        return list(_search(query_norm, top_k, score_threshold))
+
+    bucket = int(time.time() // RAG_CACHE_TTL)
+    return list(_search_cached(query_norm, top_k, score_threshold, bucket))
+
+
+@lru_cache(maxsize=512)
+def _search_cached(
+    query_norm: str,
+    top_k: int,
+    score_threshold: float,
+    _time_bucket: int,
+) -> tuple[str, ...]:
+    """_search, memoised per time bucket."""
+    return _search(query_norm, top_k, score_threshold)
+
+
+def _search(query_norm: str, top_k: int, score_threshold: float) -> tuple[str, ...]:
+    """Run the actual embedding + Pinecone query."""
+    index = _get_pinecone_index()
+    embedding = get_embedding(query_norm)
     results = index.query(
         vector=embedding,
         top_k=top_k,
@@ -84,4 +169,4 @@ def search_context(
             if text:
                 chunks.append(text)
 
-    return chunks
+    return tuple(chunks)
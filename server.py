@@ -19,25 +19,70 @@ Usage:
 """
 
 import os
-import json
+import logging
+import threading
+import time
+from functools import lru_cache
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, Response
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from conversation_store import ConversationStore  # noqa: E402
-from rag import search_context                    # noqa: E402
+from rag import get_embedding, search_context, _get_pinecone_client  # noqa: E402
+
+
+class OrJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (request parsing + jsonify)."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrJSONProvider(app)
 CORS(app)
 
 # ── Config ──────────────────────────────────────────────────────────────────
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL    = os.environ.get("OLLAMA_MODEL", "mistral:7b")
+PINECONE_HEALTH_TTL = 30  # seconds between real Pinecone probes in /health
+LOG_PROMPTS     = bool(os.environ.get("LOG_PROMPTS"))  # dump LLM payloads
+RAG_MIN_TOKENS  = int(os.environ.get("RAG_MIN_TOKENS", "3"))  # shorter turns skip RAG
+HISTORY_TURNS   = int(os.environ.get("HISTORY_TURNS", "20"))  # user+assistant pairs sent to LLM
 # ────────────────────────────────────────────────────────────────────────────
 
+logger = logging.getLogger(__name__)
+if LOG_PROMPTS:
+    logging.basicConfig()
+    logger.setLevel(logging.DEBUG)
+
+# Fillers / stopwords — an utterance made only of these never triggers RAG
+_LOW_SIGNAL_WORDS = frozenset("""
+    yes yeah yep yup no nope nah ok okay k sure right alright fine cool great
+    thanks thank you please hi hello hey bye goodbye uh um uhm hmm mm mhm huh
+    oh ah so well and but or the a an it is that this i me my we to of in on
+    just really very good nice got see
+""".split())
+_STRIP_PUNCT = ".,!?;:'\"-…"
+
+# SSE framing prefix ("data: {...}") — compared as bytes in the stream loop
+_SSE_PREFIX = b"data: "
+_SSE_PREFIX_LEN = len(_SSE_PREFIX)
+
+# Keep-alive session for Ollama (chat streaming + health checks)
+ollama_http = requests.Session()
+ollama_http.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=40))
+ollama_http.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=40))
+
 # Conversation store (SQLite — auto-created on first run)
 store = ConversationStore()
 
@@ -55,34 +100,19 @@ def chat_completions():
     vapi_data = request.get_json()
 
     # 1. Identify the call (for conversation tracking)
-    call_id = _extract_call_id(vapi_data)
+    call_id = _extract_call_id(vapi_data, request.headers)
 
     # 2. Pull out the latest user message
     incoming_messages = vapi_data.get("messages", [])
     user_message = _get_latest_user_message(incoming_messages)
 
-    # 3. Persist the user turn
-    if user_message:
-        store.add_message(call_id, "user", user_message)
+    # 3. RAG: embed → search Pinecone → get relevant chunks
+    rag_context = _get_rag_context(user_message)
 
-    # 4. RAG: embed → search Pinecone → get relevant chunks
-    rag_context = ""
-    if user_message:
-        try:
-            chunks = search_context(user_message)
-            if chunks:
-                rag_context = (
-                    "\n\n--- Relevant knowledge-base context ---\n"
-                    + "\n\n".join(chunks)
-                    + "\n--- End of context ---\n"
-                )
-        except Exception as e:
-            print(f"[RAG] Search failed (continuing without context): {e}")
-
-    # 5. Build the full messages array: system + RAG + conversation history
-    messages = _build_messages(call_id, rag_context, incoming_messages)
-
-    # 6. Prepare & forward to Ollama
+    # 4. Build the full messages array: system + RAG + history + user turn
+    messages = _build_messages(call_id, rag_context, incoming_messages, user_message)
+
+    # 5. Prepare & forward to Ollama
     ollama_payload = {
         "model": OLLAMA_MODEL,
         "messages": messages,
@@ -90,63 +120,69 @@ def chat_completions():
     }
     ollama_url = f"{OLLAMA_BASE_URL}/v1/chat/completions"
 
-    # Debug: print the full messages payload sent to the LLM
-    print("\n" + "=" * 60)
-    print("  MESSAGES SENT TO LLM")
-    print("=" * 60)
-    for i, msg in enumerate(messages):
-        role = msg["role"].upper()
-        content = msg["content"]
-        # Truncate long content for readability
-        # preview = content if len(content) <= 300 else content[:300] + "…"
-        print(f"  [{i}] {role}: {content}")
-    print("=" * 60 + "\n")
+    # Debug: log the full messages payload (off unless LOG_PROMPTS is set)
+    if LOG_PROMPTS:
+        logger.debug("payload=%s", messages)
 
     try:
-        ollama_response = requests.post(
+        ollama_response = ollama_http.post(
             ollama_url,
-            json=ollama_payload,
+            data=orjson.dumps(ollama_payload),
             headers={"Content-Type": "application/json"},
             stream=True,
             timeout=60,
         )
         ollama_response.raise_for_status()
     except requests.exceptions.ConnectionError:
+        store.record_turn(call_id, user_message, "")
         print("[ERROR] Cannot connect to Ollama. Is it running? (ollama serve)")
         return Response(
             _error_response("Ollama is not running. Start it with: ollama serve"),
             status=502, content_type="application/json",
         )
     except requests.exceptions.RequestException as e:
+        # Release the pooled connection of an error response (raise_for_status)
+        if e.response is not None:
+            e.response.close()
+        store.record_turn(call_id, user_message, "")
         print(f"[ERROR] Ollama request failed: {e}")
         return Response(
             _error_response(str(e)),
             status=502, content_type="application/json",
         )
 
-    # 7. Stream SSE chunks back to VAPI — capture content for history
+    # 6. Stream SSE chunks back to VAPI — capture content for history
     def generate():
         full_response: list[str] = []
+        append = full_response.append
         try:
-            for line in ollama_response.iter_lines(decode_unicode=True):
+            # Work on raw bytes: no per-line UTF-8 decode, forwarded as-is
+            for line in ollama_response.iter_lines():
                 if line:
-                    yield line + "\n\n"
+                    yield line + b"\n\n"
                     # Parse the SSE data to accumulate the assistant reply
-                    if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                    if line[:_SSE_PREFIX_LEN] == _SSE_PREFIX:
+                        payload = line[_SSE_PREFIX_LEN:]
+                        if payload.strip() == b"[DONE]":
+                            continue
                         try:
-                            data = json.loads(line[6:])
+                            data = orjson.loads(payload)
                             delta = data.get("choices", [{}])[0].get("delta", {})
                             token = delta.get("content", "")
                             if token:
-                                full_response.append(token)
-                        except (json.JSONDecodeError, IndexError, KeyError):
+                                append(token)
+                        except (orjson.JSONDecodeError, IndexError, KeyError):
                             pass
-            yield "data: [DONE]\n\n"
+            yield b"data: [DONE]\n\n"
         finally:
-            # Always persist the assistant reply (even on early disconnect)
+            # Return the connection to the shared pool and stop reading the
+            # stream, even if VAPI disconnected mid-reply (barge-in).
+            ollama_response.close()
+            # Always persist the turn (even on early disconnect) — user and
+            # assistant messages go to SQLite in a single transaction.
             assistant_text = "".join(full_response)
+            store.record_turn(call_id, user_message, assistant_text)
             if assistant_text:
-                store.add_message(call_id, "assistant", assistant_text)
                 print(f"[CTX] Stored assistant reply for call {call_id[:12]}…")
 
     return Response(generate(), content_type="text/event-stream")
@@ -154,14 +190,14 @@ def chat_completions():
 
 # ── Helpers ─────────────────────────────────────────────────────────────────
 
-def _extract_call_id(vapi_data: dict) -> str:
+def _extract_call_id(vapi_data: dict, headers) -> str:
     """Extract a stable call identifier from VAPI's request."""
     return (
         # VAPI embeds call metadata in the body
         vapi_data.get("call", {}).get("id")
         # Some VAPI versions send it as a header instead
-        or request.headers.get("x-vapi-call-id")
-        or request.headers.get("x-request-id")
+        or headers.get("x-vapi-call-id")
+        or headers.get("x-request-id")
         # Fallback (single-session mode)
         or "default_session"
     )
@@ -175,14 +211,41 @@ def _get_latest_user_message(messages: list[dict]) -> str:
     return ""
 
 
+def _is_low_signal(user_message: str) -> bool:
+    """True for short or filler-only turns ("yes", "uh huh, okay") not worth a search."""
+    toks = [t.strip(_STRIP_PUNCT) for t in user_message.lower().split()]
+    toks = [t for t in toks if t]
+    return len(toks) < RAG_MIN_TOKENS or all(t in _LOW_SIGNAL_WORDS for t in toks)
+
+
+def _get_rag_context(user_message: str) -> str:
+    """Search Pinecone for the user turn and format hits for the system prompt."""
+    if not user_message or _is_low_signal(user_message):
+        return ""
+    try:
+        chunks = search_context(user_message)
+    except Exception as e:
+        print(f"[RAG] Search failed (continuing without context): {e}")
+        return ""
+    if not chunks:
+        return ""
+    return (
+        "\n\n--- Relevant knowledge-base context ---\n"
+        + "\n\n".join(chunks)
+        + "\n--- End of context ---\n"
+    )
+
+
 def _build_messages(
     call_id: str,
     rag_context: str,
     incoming_messages: list[dict],
+    user_message: str,
 ) -> list[dict]:
     """
     Assemble the messages array sent to the LLM:
-        [system prompt + RAG]  →  [full conversation history from SQLite]
+        [system prompt + RAG]  →  [last HISTORY_TURNS turns from SQLite]
+        →  [latest user message]
 
     The system prompt is taken from VAPI's incoming messages (so you can
     still edit it in the VAPI dashboard).  RAG chunks are appended to it.
@@ -203,9 +266,13 @@ def _build_messages(
 
     messages: list[dict] = [{"role": "system", "content": system_content}]
 
-    # Full conversation history from our store (already includes latest user msg)
-    history = store.get_history(call_id)
+    # Recent conversation history from our store, capped so prompt size
+    # (and generation latency) stays flat on long calls.  The current user
+    # turn is persisted together with the reply once streaming finishes.
+    history = store.get_recent(call_id, limit=HISTORY_TURNS * 2)
     messages.extend(history)
+    if user_message:
+        messages.append({"role": "user", "content": user_message})
 
     return messages
 
@@ -216,23 +283,15 @@ def _build_messages(
 def health():
     """Health check endpoint."""
     try:
-        r = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
+        r = ollama_http.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
         models = [m["name"] for m in r.json().get("models", [])]
         ollama_status = "connected"
     except Exception:
         models = []
         ollama_status = "unreachable"
 
-    # Check Pinecone connectivity
-    pinecone_status = "not configured"
-    if os.environ.get("PINECONE_API_KEY") and os.environ.get("PINECONE_INDEX_NAME"):
-        try:
-            from pinecone import Pinecone
-            pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
-            pc.list_indexes()
-            pinecone_status = "connected"
-        except Exception:
-            pinecone_status = "error"
+    # Check Pinecone connectivity (result reused for PINECONE_HEALTH_TTL secs)
+    pinecone_status = _pinecone_status(int(time.time() // PINECONE_HEALTH_TTL))
 
     return {
         "status": "ok",
@@ -245,15 +304,57 @@ def health():
     }
 
 
-def _error_response(message: str) -> str:
+@lru_cache(maxsize=1)
+def _pinecone_status(_time_bucket: int) -> str:
+    """Probe Pinecone once per time bucket so health polls stay cheap."""
+    if not (os.environ.get("PINECONE_API_KEY") and os.environ.get("PINECONE_INDEX_NAME")):
+        return "not configured"
+    try:
+        _get_pinecone_client().list_indexes()
+        return "connected"
+    except Exception:
+        return "error"
+
+
+def _warm_up_models():
+    """Load the chat + embedding models into Ollama before the first call."""
+    try:
+        r = ollama_http.post(
+            f"{OLLAMA_BASE_URL}/v1/chat/completions",
+            data=orjson.dumps({
+                "model": OLLAMA_MODEL,
+                "messages": [{"role": "user", "content": "hi"}],
+                "stream": False,
+                "max_tokens": 1,
+            }),
+            headers={"Content-Type": "application/json"},
+            timeout=120,
+        )
+        r.raise_for_status()
+        get_embedding("warmup")
+        print("[WARMUP] Ollama models loaded")
+    except Exception as e:
+        print(f"[WARMUP] Skipped (Ollama not ready?): {e}")
+
+
+def start_warm_up():
+    """Run _warm_up_models in the background so startup isn't blocked."""
+    threading.Thread(target=_warm_up_models, daemon=True).start()
+
+
+def _error_response(
+    message: str,
+    err_type: str = "server_error",
+    code: str = "ollama_error",
+) -> str:
     """Build a JSON error payload."""
-    return json.dumps({
+    return orjson.dumps({
         "error": {
             "message": message,
-            "type": "server_error",
-            "code": "ollama_error",
+            "type": err_type,
+            "code": code,
         }
-    })
+    }).decode()
 
 
 # ── Entrypoint ──────────────────────────────────────────────────────────────
@@ -268,4 +369,8 @@ if __name__ == "__main__":
     print(f"  Memory      : SQLite (conversations.db)")
     print(f"  Endpoint    : http://localhost:5000/chat/completions")
     print("=" * 60)
+    # The debug reloader runs this block in a watcher parent and again in
+    # the serving child; only warm up from the child.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
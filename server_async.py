@@ -0,0 +1,168 @@
+"""
+Sama Wellness — Custom LLM Proxy Server (async / ASGI)
+Same behaviour as server.py, but served by FastAPI + Uvicorn with an
+httpx.AsyncClient streaming from Ollama, so one process can hold many
+concurrent VAPI calls without tying up a thread per SSE stream.
+
+Usage:
+  pip install -e ".[async]"
+  uvicorn server_async:app --host 0.0.0.0 --port 5000 --workers 2
+
+Blocking work (SQLite, RAG embedding + Pinecone search) runs via
+asyncio.to_thread so the event loop is never stalled.  Uvicorn uses
+uvloop automatically where it is installed (not on Windows).
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+
+from server import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    PINECONE_HEALTH_TTL,
+    _build_messages,
+    _error_response,
+    _extract_call_id,
+    _get_latest_user_message,
+    _get_rag_context,
+    _pinecone_status,
+    start_warm_up,
+    store,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled keep-alive client for the lifetime of the worker
+    app.state.ollama = httpx.AsyncClient(
+        timeout=httpx.Timeout(60.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    start_warm_up()
+    try:
+        yield
+    finally:
+        await app.state.ollama.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"],
+                   allow_headers=["*"])
+
+
+# ── Main endpoint ───────────────────────────────────────────────────────────
+
+@app.post("/chat/completions")
+@app.post("/")
+async def chat_completions(request: Request):
+    """Async twin of server.chat_completions — see that for the full flow."""
+    try:
+        vapi_data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        # Match Flask's get_json, which rejects malformed bodies with a 400
+        return Response(
+            _error_response("Request body is not valid JSON",
+                            err_type="invalid_request_error", code="bad_request"),
+            status_code=400, media_type="application/json",
+        )
+
+    call_id = _extract_call_id(vapi_data, request.headers)
+    incoming_messages = vapi_data.get("messages", [])
+    user_message = _get_latest_user_message(incoming_messages)
+
+    rag_context = await asyncio.to_thread(_get_rag_context, user_message)
+    messages = await asyncio.to_thread(
+        _build_messages, call_id, rag_context, incoming_messages, user_message
+    )
+
+    client: httpx.AsyncClient = request.app.state.ollama
+    ollama_request = client.build_request(
+        "POST",
+        f"{OLLAMA_BASE_URL}/v1/chat/completions",
+        content=orjson.dumps(
+            {"model": OLLAMA_MODEL, "messages": messages, "stream": True}
+        ),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        ollama_response = await client.send(ollama_request, stream=True)
+        ollama_response.raise_for_status()
+    except httpx.ConnectError:
+        await asyncio.to_thread(store.record_turn, call_id, user_message, "")
+        print("[ERROR] Cannot connect to Ollama. Is it running? (ollama serve)")
+        return Response(
+            _error_response("Ollama is not running. Start it with: ollama serve"),
+            status_code=502, media_type="application/json",
+        )
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.HTTPStatusError):
+            await e.response.aclose()
+        await asyncio.to_thread(store.record_turn, call_id, user_message, "")
+        print(f"[ERROR] Ollama request failed: {e}")
+        return Response(
+            _error_response(str(e)),
+            status_code=502, media_type="application/json",
+        )
+
+    async def generate():
+        full_response: list[str] = []
+        try:
+            async for line in ollama_response.aiter_lines():
+                if line:
+                    yield line + "\n\n"
+                    if line.startswith("data: ") and line[6:].strip() != "[DONE]":
+                        try:
+                            data = orjson.loads(line[6:])
+                            delta = data.get("choices", [{}])[0].get("delta", {})
+                            token = delta.get("content", "")
+                            if token:
+                                full_response.append(token)
+                        except (orjson.JSONDecodeError, IndexError, KeyError):
+                            pass
+            yield "data: [DONE]\n\n"
+        finally:
+            await ollama_response.aclose()
+            # Always persist the turn (even on early disconnect)
+            assistant_text = "".join(full_response)
+            await asyncio.to_thread(store.record_turn, call_id, user_message,
+                                    assistant_text)
+            if assistant_text:
+                print(f"[CTX] Stored assistant reply for call {call_id[:12]}…")
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+# ── Health ──────────────────────────────────────────────────────────────────
+
+@app.get("/health")
+async def health(request: Request):
+    """Health check endpoint."""
+    try:
+        r = await request.app.state.ollama.get(f"{OLLAMA_BASE_URL}/api/tags",
+                                               timeout=5)
+        models = [m["name"] for m in r.json().get("models", [])]
+        ollama_status = "connected"
+    except Exception:
+        models = []
+        ollama_status = "unreachable"
+
+    pinecone_status = await asyncio.to_thread(
+        _pinecone_status, int(time.time() // PINECONE_HEALTH_TTL)
+    )
+
+    return {
+        "status": "ok",
+        "ollama": ollama_status,
+        "ollama_url": OLLAMA_BASE_URL,
+        "configured_model": OLLAMA_MODEL,
+        "available_models": models,
+        "pinecone": pinecone_status,
+        "conversation_db": "SQLite (conversations.db)",
+    }